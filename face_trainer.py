@@ -9,51 +9,248 @@ saves their facial encoding for later recognition.
 
 import os
 import cv2
+import glob
 import time
 import pickle
 import numpy as np
+import dlib
 import face_recognition
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 
+# hnswlib is optional; without it recognition falls back to a linear scan
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
 # Create directories if they don't exist
 os.makedirs('data/trained_faces', exist_ok=True)
 os.makedirs('data/face_images', exist_ok=True)
 
 # Path to save encodings
-ENCODINGS_FILE = 'data/trained_faces/encodings.pkl'
+ENCODINGS_FILE = 'data/trained_faces/encodings.npz'
+
+# Encodings file written by older versions, migrated on first load
+LEGACY_ENCODINGS_FILE = 'data/trained_faces/encodings.pkl'
+
+# Path to save the nearest-neighbour index over the encodings
+INDEX_FILE = 'data/trained_faces/hnsw.bin'
+
+# Size of a face_recognition encoding
+ENCODING_DIM = 128
+
+# Maximum encoding distance for two faces to be considered the same person
+MATCH_TOLERANCE = 0.6
+
+# Maximum number of encodings kept per person
+MAX_SAMPLES_PER_NAME = 10
+
+# Image file extensions picked up when training from a folder
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Number of same-sized images sent to the GPU together in CNN mode
+CNN_BATCH_SIZE = 8
+
+# Use dlib's CNN face detector when dlib was built with CUDA, HOG otherwise.
+# Set FACE_REC_DETECTOR=hog to keep HOG even with a CUDA build.
+USE_CNN = dlib.DLIB_USE_CUDA and os.environ.get('FACE_REC_DETECTOR', 'auto').lower() != 'hog'
 
 def load_encodings():
-    """Load existing encodings if available"""
+    """Load existing encodings if available
+    
+    Encodings are kept as a single (N, 128) float32 matrix whose rows line up
+    with the entries in 'names'. On disk they are stored quantized to int8.
+    """
+    if not os.path.exists(ENCODINGS_FILE) and os.path.exists(LEGACY_ENCODINGS_FILE):
+        migrate_legacy_encodings()
+    
     if os.path.exists(ENCODINGS_FILE):
-        with open(ENCODINGS_FILE, 'rb') as f:
-            return pickle.load(f)
-    return {'names': [], 'encodings': []}
+        with np.load(ENCODINGS_FILE) as f:
+            if 'enc_q' in f:
+                # 'scale' is per row; files from older versions have a single scale
+                encodings = f['enc_q'].astype(np.float32) / np.reshape(f['scale'], (-1, 1))
+            else:
+                encodings = f['enc']
+            return {'names': f['names'].tolist(), 'encodings': encodings}
+    return {'names': [], 'encodings': np.empty((0, ENCODING_DIM), dtype=np.float32)}
+
+def migrate_legacy_encodings():
+    """Convert a pickled encodings file from an older version to the .npz format"""
+    with open(LEGACY_ENCODINGS_FILE, 'rb') as f:
+        legacy = pickle.load(f)
+    
+    encodings = np.asarray(legacy['encodings'], dtype=np.float32).reshape(-1, ENCODING_DIM)
+    save_encodings({'names': list(legacy['names']), 'encodings': encodings})
+    print(f"Migrated {LEGACY_ENCODINGS_FILE} to {ENCODINGS_FILE}")
+
+def consolidate_encodings(data):
+    """Keep at most MAX_SAMPLES_PER_NAME encodings per person
+    
+    While a person has too many samples, one sample of the closest pair is
+    dropped, so the most distinct samples are the ones kept.
+    """
+    names = np.array(data['names'], dtype=str)
+    keep = np.ones(len(names), dtype=bool)
+    
+    for name in set(data['names']):
+        rows = np.flatnonzero(names == name)
+        if len(rows) <= MAX_SAMPLES_PER_NAME:
+            continue
+        
+        # Squared distances from the Gram matrix, |a|^2 + |b|^2 - 2 a.b, without
+        # an N x N x 128 temporary
+        encodings = np.asarray(data['encodings'][rows], dtype=np.float32)
+        sq_norms = np.einsum('ij,ij->i', encodings, encodings)
+        distances = sq_norms[:, None] + sq_norms[None, :] - 2.0 * (encodings @ encodings.T)
+        np.fill_diagonal(distances, np.inf)
+        
+        # Track each sample's nearest neighbour so a drop only rescans the rows
+        # that pointed at the dropped sample
+        nearest = np.argmin(distances, axis=1)
+        nearest_distance = distances[np.arange(len(rows)), nearest]
+        
+        for _ in range(len(rows) - MAX_SAMPLES_PER_NAME):
+            drop = int(np.argmin(nearest_distance))
+            distances[drop, :] = np.inf
+            distances[:, drop] = np.inf
+            nearest_distance[drop] = np.inf
+            keep[rows[drop]] = False
+            
+            stale = np.flatnonzero((nearest == drop) & np.isfinite(nearest_distance))
+            if len(stale):
+                nearest[stale] = np.argmin(distances[stale], axis=1)
+                nearest_distance[stale] = distances[stale, nearest[stale]]
+    
+    data['names'] = names[keep].tolist()
+    data['encodings'] = data['encodings'][keep]
+    return data
 
 def save_encodings(data):
     """Save encodings to disk"""
-    with open(ENCODINGS_FILE, 'wb') as f:
-        pickle.dump(data, f)
+    consolidate_encodings(data)
+    
+    # Quantize to int8 with a symmetric scale per row; the rounding error is far
+    # below the match tolerance. A row's scale only depends on that row, so rows
+    # loaded from disk quantize back to the same values on every save instead
+    # of being rounded again.
+    max_values = np.abs(data['encodings']).max(axis=1).astype(np.float32)
+    scale = np.ones(len(max_values), dtype=np.float32)
+    np.divide(127.0, max_values, out=scale, where=max_values > 0)
+    enc_q = np.round(data['encodings'] * scale[:, None]).astype(np.int8)
+    
+    np.savez_compressed(ENCODINGS_FILE,
+                        names=np.array(data['names'], dtype=str),
+                        enc_q=enc_q,
+                        scale=scale)
     print(f"Encodings saved to {ENCODINGS_FILE}")
+    build_index(data)
 
-def capture_face(name):
-    """Capture and process face images for the given name"""
-    print(f"\nTraining system to recognize {name}...")
-    print("Position your face in front of the camera.")
+def build_index(data):
+    """Build and save an HNSW index over the encodings for fast lookup"""
+    if hnswlib is None or not data['names']:
+        # Remove any index from an earlier save so it can't be matched against
+        # encodings it wasn't built from
+        if os.path.exists(INDEX_FILE):
+            os.remove(INDEX_FILE)
+        return None
     
-    # Initialize camera
+    num_elements = len(data['names'])
+    index = hnswlib.Index(space='l2', dim=ENCODING_DIM)
+    index.init_index(max_elements=max(num_elements, 1024), ef_construction=100, M=16)
+    index.add_items(data['encodings'], np.arange(num_elements))
+    index.save_index(INDEX_FILE)
+    print(f"Index saved to {INDEX_FILE}")
+    return index
+
+def load_index(num_elements):
+    """Load the HNSW index if available"""
+    if hnswlib is None or not os.path.exists(INDEX_FILE):
+        return None
+    
+    index = hnswlib.Index(space='l2', dim=ENCODING_DIM)
+    index.load_index(INDEX_FILE, max_elements=max(num_elements, 1024))
+    if index.get_current_count() != num_elements:
+        # The index is out of date with the saved encodings
+        return None
+    return index
+
+def prepare_matcher(data):
+    """Lay the encodings out for matching and precompute their squared norms"""
+    data['encodings'] = np.ascontiguousarray(data['encodings'], dtype=np.float32)
+    data['sq_norms'] = np.einsum('ij,ij->i', data['encodings'], data['encodings'])
+    return data
+
+def find_match(data, index, encoding):
+    """Return the name of the closest trained face, or None if nobody matches"""
+    # Distances are compared squared, so no square root is needed
+    if index is not None:
+        labels, distances = index.knn_query(encoding, k=1)
+        # hnswlib's 'l2' space reports squared distances
+        best, sq_distance = int(labels[0][0]), float(distances[0][0])
+    else:
+        # |a - b|^2 = |a|^2 - 2 a.b + |b|^2; |b|^2 is the same for every row, so
+        # the ranking only needs one matrix-vector product
+        scores = data['sq_norms'] - 2.0 * (data['encodings'] @ encoding)
+        best = int(np.argmin(scores))
+        sq_distance = float(scores[best]) + float(encoding @ encoding)
+    
+    if sq_distance <= MATCH_TOLERANCE ** 2:
+        return data['names'][best]
+    return None
+
+def open_camera():
+    """Open the default camera, or return None if it is unavailable"""
     camera = cv2.VideoCapture(0)
     if not camera.isOpened():
         print("Error: Could not open camera.")
-        return False
+        return None
     
     # Set camera resolution
     camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
     camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    return camera
+
+def detect_face(rgb_frame):
+    """Return the (top, right, bottom, left) box of the first face, or None"""
+    # Find face locations on a half-size copy to cut the HOG pyramid work;
+    # nearest-neighbour sampling is enough for the detector at this scale
+    small_rgb = cv2.resize(rgb_frame, (0, 0), fx=0.5, fy=0.5, interpolation=cv2.INTER_NEAREST)
+    face_locations = face_recognition.face_locations(
+        small_rgb,
+        number_of_times_to_upsample=0 if USE_CNN else 1,
+        model="cnn" if USE_CNN else "hog"
+    )
     
-    face_encodings = []
+    if not face_locations:
+        return None
+    
+    # Use the first face found, scaled back to full resolution
+    return tuple(coord * 2 for coord in face_locations[0])
+
+def capture_face(name):
+    """Capture and process face images for the given name"""
+    print(f"\nTraining system to recognize {name}...")
+    print("Position your face in front of the camera.")
+    
+    # Initialize camera
+    camera = open_camera()
+    if camera is None:
+        return False
+    
+    # Frames and face boxes are collected first and encoded together afterwards
+    captured_rgb_frames = []
+    captured_boxes = []
     num_samples = 5
     current_sample = 0
     
+    # Face detection runs on a worker thread (dlib releases the GIL) so the
+    # preview keeps updating while a sample is processed
+    executor = ThreadPoolExecutor(max_workers=1)
+    pending = None  # (future, rgb_frame, frame) of the sample being processed
+    next_capture_time = 0
+    
     try:
         while current_sample < num_samples:
             # Capture frame
@@ -62,9 +259,37 @@ def capture_face(name):
                 print("Error: Failed to capture frame.")
                 break
             
+            # Collect the result of a finished detection
+            if pending is not None and pending[0].done():
+                future, rgb_frame, sample_frame = pending
+                pending = None
+                box = future.result()
+                
+                if box is None:
+                    print("No face detected. Please position your face properly.")
+                else:
+                    top, right, bottom, left = box
+                    face_image = sample_frame[top:bottom, left:right]
+                    
+                    # Save face image
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    image_path = f"data/face_images/{name}_{timestamp}_{current_sample}.jpg"
+                    cv2.imwrite(image_path, face_image)
+                    
+                    # Keep the full-resolution frame and box for encoding
+                    captured_rgb_frames.append(rgb_frame)
+                    captured_boxes.append(box)
+                    current_sample += 1
+                    print(f"Sample {current_sample}/{num_samples} captured")
+                    
+                    # Give the user a moment to reposition before the next sample
+                    next_capture_time = time.time() + 1
+            
             # Display countdown
             sample_text = f"Sample: {current_sample+1}/{num_samples}"
             cv2.putText(frame, sample_text, (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+            if pending is not None:
+                cv2.putText(frame, "PROCESSING...", (20, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
             
             # Show the frame
             cv2.imshow('Capture Face', frame)
@@ -72,61 +297,136 @@ def capture_face(name):
             
             # Capture sample on spacebar press
             if key == 32:  # Spacebar
-                # Find face locations
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                face_locations = face_recognition.face_locations(rgb_frame)
-                
-                if not face_locations:
-                    print("No face detected. Please position your face properly.")
-                    continue
-                
-                # Use the first face found
-                top, right, bottom, left = face_locations[0]
-                face_image = frame[top:bottom, left:right]
-                
-                # Save face image
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                image_path = f"data/face_images/{name}_{timestamp}_{current_sample}.jpg"
-                cv2.imwrite(image_path, face_image)
-                
-                # Get face encoding
-                encodings = face_recognition.face_encodings(rgb_frame, [face_locations[0]])
-                if encodings:
-                    face_encodings.append(encodings[0])
-                    current_sample += 1
-                    print(f"Sample {current_sample}/{num_samples} captured")
-                    
-                    # Add a short delay to allow user to reposition
-                    time.sleep(1)
-                else:
-                    print("Could not encode face. Please try again.")
+                if pending is None and time.time() >= next_capture_time:
+                    # Find the face location in the background
+                    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    pending = (executor.submit(detect_face, rgb_frame), rgb_frame, frame)
                 
             # Press 'q' to quit
             elif key == ord('q'):
                 return False
     
     finally:
+        executor.shutdown(wait=True)
         camera.release()
         cv2.destroyAllWindows()
     
+    # Encode all samples in one pass once capturing is done
+    face_encodings = []
+    if len(captured_boxes) == num_samples:
+        print("Encoding samples...")
+        for rgb_frame, box in zip(captured_rgb_frames, captured_boxes):
+            face_encodings.extend(face_recognition.face_encodings(rgb_frame, [box]))
+    
     # If we collected all samples
     if len(face_encodings) == num_samples:
-        # Load existing encodings
-        data = load_encodings()
-        
-        # Add new encodings
-        for encoding in face_encodings:
-            data['names'].append(name)
-            data['encodings'].append(encoding)
-        
-        # Save updated encodings
-        save_encodings(data)
+        add_encodings(name, face_encodings)
         print(f"Successfully trained system to recognize {name}!")
         return True
     
     print("Training incomplete. Please try again.")
     return False
 
+def add_encodings(name, face_encodings):
+    """Add encodings for the given name to the saved encodings"""
+    # Load existing encodings
+    data = load_encodings()
+    
+    # Add new encodings
+    enc32 = np.asarray(face_encodings, dtype=np.float32)
+    data['encodings'] = np.vstack([data['encodings'], enc32])
+    data['names'].extend([name] * len(enc32))
+    
+    # Save updated encodings
+    save_encodings(data)
+
+def _encode_one(path):
+    """Return the encoding of the first face in an image file, or None"""
+    try:
+        image = face_recognition.load_image_file(path)
+        face_locations = face_recognition.face_locations(image, model="cnn" if USE_CNN else "hog")
+        if not face_locations:
+            return None
+        
+        encodings = face_recognition.face_encodings(image, [face_locations[0]])
+        return encodings[0] if encodings else None
+    except Exception as e:
+        # Skip unreadable or corrupt files instead of aborting the whole folder
+        print(f"Skipping {path}: {str(e)}")
+        return None
+
+def _encode_batch(batch):
+    """Return the encodings of the first face in each of a batch of same-sized (path, image) pairs"""
+    images = [image for _, image in batch]
+    try:
+        batch_locations = face_recognition.batch_face_locations(images, batch_size=len(images))
+    except Exception as e:
+        # Detect each image on its own instead, so one bad image doesn't lose the batch
+        print(f"Batch detection failed, retrying images one at a time: {str(e)}")
+        batch_locations = [None] * len(batch)
+    
+    encodings = []
+    for (path, image), face_locations in zip(batch, batch_locations):
+        try:
+            if face_locations is None:
+                face_locations = face_recognition.face_locations(image, model="cnn")
+            if face_locations:
+                encodings.extend(face_recognition.face_encodings(image, [face_locations[0]]))
+        except Exception as e:
+            print(f"Skipping {path}: {str(e)}")
+    return encodings
+
+def batch_encode_folder(paths):
+    """Encode the face in each image, spreading the work across CPU cores or GPU batches"""
+    if not USE_CNN:
+        with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            results = list(executor.map(_encode_one, paths))
+        return [encoding for encoding in results if encoding is not None]
+    
+    # On the GPU, detect faces in batches; a batch must hold images of one size.
+    # At most CNN_BATCH_SIZE images are held at once: when that many are
+    # pending, the largest same-sized group is encoded to make room.
+    encodings = []
+    pending = {}
+    num_pending = 0
+    for path in paths:
+        try:
+            image = face_recognition.load_image_file(path)
+        except Exception as e:
+            print(f"Skipping {path}: {str(e)}")
+            continue
+        pending.setdefault(image.shape, []).append((path, image))
+        num_pending += 1
+        if num_pending == CNN_BATCH_SIZE:
+            largest = max(pending, key=lambda shape: len(pending[shape]))
+            batch = pending.pop(largest)
+            num_pending -= len(batch)
+            encodings.extend(_encode_batch(batch))
+    for batch in pending.values():
+        encodings.extend(_encode_batch(batch))
+    return encodings
+
+def train_from_folder(name, folder):
+    """Train the given name from all face images in a folder"""
+    # Match extensions case-insensitively so camera-style *.JPG files are included
+    paths = sorted(
+        path for path in glob.glob(os.path.join(folder, '*'))
+        if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+    )
+    if not paths:
+        print(f"No images found in {folder}.")
+        return False
+    
+    print(f"Encoding {len(paths)} images...")
+    face_encodings = batch_encode_folder(paths)
+    if not face_encodings:
+        print("No faces found in the images.")
+        return False
+    
+    add_encodings(name, face_encodings)
+    print(f"Trained {name} from {len(face_encodings)} of {len(paths)} images.")
+    return True
+
 def list_known_faces():
     """List all people the system has been trained to recognize"""
     data = load_encodings()
@@ -135,18 +435,65 @@ def list_known_faces():
         return
     
     # Count unique names
-    unique_names = {}
-    for name in data['names']:
-        if name in unique_names:
-            unique_names[name] += 1
-        else:
-            unique_names[name] = 1
+    counts = Counter(data['names'])
     
     print("\nTrained Faces:")
     print("-------------")
-    for name, count in unique_names.items():
+    for name, count in counts.most_common():
         print(f"- {name}: {count} samples")
 
+def recognize_face():
+    """Identify the person in front of the camera using the trained faces"""
+    data = load_encodings()
+    if not data['names']:
+        print("No faces have been trained yet.")
+        return
+    
+    # Load the index and prepare the encodings once and reuse them for every lookup
+    index = load_index(len(data['names']))
+    prepare_matcher(data)
+    
+    camera = open_camera()
+    if camera is None:
+        return
+    
+    print("\nPress SPACE to identify the face in view, 'q' to return to the menu.")
+    
+    # RGB conversions reuse one buffer instead of allocating a frame each time
+    rgb_frame = None
+    
+    try:
+        while True:
+            ret, frame = camera.read()
+            if not ret:
+                print("Error: Failed to capture frame.")
+                break
+            
+            cv2.imshow('Recognize Face', frame)
+            key = cv2.waitKey(1)
+            
+            if key == 32:  # Spacebar
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb_frame)
+                box = detect_face(rgb_frame)
+                if box is None:
+                    print("No face detected. Please position your face properly.")
+                    continue
+                
+                encodings = face_recognition.face_encodings(rgb_frame, [box])
+                if not encodings:
+                    print("Could not encode face. Please try again.")
+                    continue
+                
+                name = find_match(data, index, encodings[0].astype(np.float32))
+                print(f"Recognized: {name}" if name else "Face not recognized.")
+            
+            elif key == ord('q'):
+                break
+    
+    finally:
+        camera.release()
+        cv2.destroyAllWindows()
+
 def main():
     print("Face Recognition Trainer")
     print("=======================")
@@ -154,10 +501,12 @@ def main():
     while True:
         print("\nOptions:")
         print("1. Add a new face")
-        print("2. List known faces")
-        print("3. Exit")
+        print("2. Add a face from an image folder")
+        print("3. List known faces")
+        print("4. Recognize a face")
+        print("5. Exit")
         
-        choice = input("\nEnter your choice (1-3): ")
+        choice = input("\nEnter your choice (1-5): ")
         
         if choice == '1':
             name = input("Enter the person's name: ")
@@ -167,9 +516,22 @@ def main():
                 print("Name cannot be empty.")
         
         elif choice == '2':
-            list_known_faces()
+            name = input("Enter the person's name: ")
+            folder = input("Enter the image folder: ")
+            if not name:
+                print("Name cannot be empty.")
+            elif not os.path.isdir(folder):
+                print("Folder not found.")
+            else:
+                train_from_folder(name, folder)
         
         elif choice == '3':
+            list_known_faces()
+        
+        elif choice == '4':
+            recognize_face()
+        
+        elif choice == '5':
             print("Exiting...")
             break
         
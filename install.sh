@@ -85,9 +85,9 @@ echo "Installing build essentials and development libraries..."
 apt_install python3-dev python3-pip python3-venv
 apt_install espeak
 
-# Install SDL libraries for pygame
-echo "Installing SDL libraries for audio playback..."
-apt_install libsdl2-dev libsdl2-mixer-2.0-0
+# Install PortAudio for sounddevice
+echo "Installing PortAudio for audio playback..."
+apt_install libportaudio2
 
 # Install libraries for sounddevice and soundfile
 echo "Installing libraries for audio recording..."
@@ -139,7 +139,7 @@ fi
 print_header "Setting up application directories"
 
 # Create directories
-mkdir -p logs data/audio data/custom
+mkdir -p logs data/audio data/custom data/models
 
 # Set proper permissions
 chmod -R 755 logs data
@@ -7,15 +7,25 @@ takes photos of detected faces, and greets people via audio after a buffer perio
 """
 
 import os
+import sys
 import cv2
 import time
 import logging
+import logging.handlers
+import queue
+import atexit
 import datetime
-import subprocess
+import glob
+import stat
 import argparse
-import pygame
 import random
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import select
+import numpy as np
+import sounddevice as sd
+import soundfile as sf
 from pathlib import Path
 
 # Parse command line arguments
@@ -24,18 +34,41 @@ parser.add_argument('--camera', type=str, default=None,
                     help='Camera device path (e.g., /dev/video0) or index (e.g., 0, 1)')
 parser.add_argument('--list-cameras', action='store_true',
                     help='List available camera devices and indices')
+parser.add_argument('--detector', choices=['yunet', 'dnn', 'lbp', 'haar'], default='dnn',
+                    help='Face detector to use (default: dnn; yunet falls back to dnn, and dnn to lbp, '
+                         'then haar, if a model is missing)')
+parser.add_argument('--min-face-size', type=int, default=80,
+                    help='Smallest face to detect, in pixels (default: 80)')
+parser.add_argument('--max-face-size', type=int, default=320,
+                    help='Largest face to detect, in pixels (default: 320)')
+parser.add_argument('--max-cameras', type=int, default=3,
+                    help='Number of camera indices to probe when searching for a camera (default: 3)')
+parser.add_argument('--pixel-format', choices=['yuyv', 'mjpg'], default='yuyv',
+                    help='Camera pixel format: raw yuyv (no grayscale conversion) or compressed mjpg '
+                         '(less USB bandwidth) (default: yuyv)')
+parser.add_argument('--target-fps', type=float, default=None,
+                    help='Decode and process at most this many frames per second (default: camera rate)')
+parser.add_argument('--detect-every', type=int, default=3,
+                    help='Run face detection on every Nth frame and reuse the boxes in between (default: 3)')
+parser.add_argument('--verbose', action='store_true',
+                    help='Log every face detection (debug logging)')
+parser.add_argument('--headless', action='store_true',
+                    help='Run without a preview window (type q and Enter to quit)')
 args = parser.parse_args()
 
-# Configure logging
+# Configure logging. Records are queued and written by a listener thread,
+# so file and console I/O stay off the detection loop.
 os.makedirs('logs', exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f"logs/face_detection_{datetime.datetime.now().strftime('%Y%m%d')}.log"),
-        logging.StreamHandler()
-    ]
-)
+file_handler = logging.FileHandler(f"logs/face_detection_{datetime.datetime.now().strftime('%Y%m%d')}.log",
+                                   delay=True)
+console_handler = logging.StreamHandler()
+for handler in (file_handler, console_handler):
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+log_queue = queue.Queue(-1)
+logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, handlers=[logging.handlers.QueueHandler(log_queue)])
+log_listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
 # Ensure the sounds directory exists and create required folders if they don't exist
@@ -48,25 +81,123 @@ photos_dir = 'data/photos'
 os.makedirs(photos_dir, exist_ok=True)
 os.chmod(photos_dir, 0o755)
 
-# Initialize pygame mixer for audio
-pygame.mixer.init()
+# OpenCV ResNet-SSD face detector model files (downloaded by setup.py)
+DNN_PROTO_FILE = 'data/models/deploy.prototxt'
+DNN_MODEL_FILE = 'data/models/res10_300x300_ssd_iter_140000.caffemodel'
+
+# YuNet face detector (the libfacedetection CNN), run through cv2.FaceDetectorYN
+YUNET_MODEL_FILE = 'data/models/face_detection_yunet_2023mar.onnx'
+
+# LBP face cascade (not bundled with the opencv-python wheels, downloaded by setup.py)
+LBP_CASCADE_FILE = 'data/models/lbpcascade_frontalface_improved.xml'
+
+# KCF trackers move boxes between detections; they are only in opencv-contrib builds
+KCF_TRACKER_CREATE = getattr(cv2, 'TrackerKCF_create', None) or \
+    getattr(getattr(cv2, 'legacy', None), 'TrackerKCF_create', None)
+
+# V4L2 opens devices directly on Linux instead of trying every backend in turn
+CAMERA_BACKEND = cv2.CAP_V4L2 if sys.platform.startswith('linux') else cv2.CAP_ANY
+
+# Remembers the last camera source that opened successfully
+CAMERA_CACHE_FILE = os.path.expanduser('~/.face_rec_camera')
+
+def camera_index_exists(idx):
+    """Check whether a camera index can exist, without opening it"""
+    # On Linux every V4L2 camera has a device node, so missing nodes can be skipped
+    return not sys.platform.startswith('linux') or os.path.exists(f'/dev/video{idx}')
+
+def open_capture(source):
+    """Open a camera with a one-frame driver buffer, so reads return the newest frame"""
+    cap = cv2.VideoCapture(source, CAMERA_BACKEND)
+    if cap.isOpened() and not cap.set(cv2.CAP_PROP_BUFFERSIZE, 1):
+        # The capture thread grabs continuously, which drains the queue anyway
+        logger.warning(f"Camera {source} does not support setting the buffer size")
+    return cap
+
+class CameraThread(threading.Thread):
+    """Reads frames from a camera in the background, keeping only the newest one"""
+    def __init__(self, camera, target_fps=None):
+        super().__init__(daemon=True)
+        self.camera = camera
+        self.frame_interval = 1.0 / target_fps if target_fps else 0
+        self.last_retrieve = 0
+        self.latest_frame = None
+        self.failed = False
+        self.stop_event = threading.Event()
+        self.new_frame = threading.Event()
+        self._lock = threading.Lock()
+    
+    def run(self):
+        """Read frames until stopped or a read fails"""
+        # VideoCapture calls release the GIL, so capture overlaps with detection
+        while not self.stop_event.is_set():
+            # Grab every frame to keep the driver queue drained, but only decode
+            # the ones needed to reach the target frame rate
+            ret = self.camera.grab()
+            frame = None
+            if ret:
+                now = time.time()
+                if now - self.last_retrieve < self.frame_interval:
+                    continue
+                ret, frame = self.camera.retrieve()
+                self.last_retrieve = now
+            with self._lock:
+                if ret:
+                    self.latest_frame = frame
+                else:
+                    self.failed = True
+                self.new_frame.set()
+            if not ret:
+                break
+    
+    def take_frame(self, timeout=0.1):
+        """Wait for a new frame and return it, or None if none arrived"""
+        if not self.new_frame.wait(timeout):
+            return None
+        with self._lock:
+            frame, self.latest_frame = self.latest_frame, None
+            self.new_frame.clear()
+        return frame
+    
+    def stop(self):
+        """Stop reading and wait for the thread to exit"""
+        self.stop_event.set()
+        self.join()
 
 class FaceDetectionApp:
-    def __init__(self, camera_source=None):
+    def __init__(self, camera_source=None, detector='dnn', headless=False, max_cameras=3,
+                 min_face_size=80, max_face_size=320, pixel_format='yuyv', target_fps=None,
+                 detect_every=3):
+        self.headless = headless
+        self.target_fps = target_fps
+        
         # Initialize the camera
         self.camera = None
+        self.max_cameras = max_cameras
         self.init_camera(camera_source)
         
-        # Set camera resolution to optimize performance
+        # Frames are read on a background thread; the main loop takes the newest one
+        self.reader = None
+        
+        # Set camera resolution and pixel format to optimize performance
+        self.pixel_format = pixel_format
+        self.raw_yuyv = False
+        self.frame_size = (640, 480)
         if self.camera and self.camera.isOpened():
-            self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+            self.configure_camera()
         
-        # Load the face cascade classifier
-        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        self.face_cascade = cv2.CascadeClassifier(cascade_path)
-        if self.face_cascade.empty():
-            raise RuntimeError("Failed to load face cascade classifier. Check OpenCV installation.")
+        # Load the DNN face detector, falling back to a cascade classifier
+        self.face_yunet = None
+        self.face_net = None
+        self.face_cascade = None
+        self.dnn_confidence = 0.5  # minimum detection confidence for the DNN
+        if detector == 'yunet':
+            self.face_yunet = self.load_yunet_detector()
+        if detector == 'dnn' or (detector == 'yunet' and self.face_yunet is None):
+            self.face_net = self.load_dnn_detector()
+        
+        if self.face_yunet is None and self.face_net is None:
+            self.face_cascade = self.load_cascade(detector)
         
         # Timing variables
         self.last_greeting_time = 0
@@ -74,13 +205,74 @@ class FaceDetectionApp:
         self.face_buffer_time = 1.0  # seconds face must be visible before processing
         self.face_detection_start_time = None
         
+        # The cascade runs on a downscaled copy of the frame; boxes are scaled back up
+        self.detection_scale = 0.5
+        self._gray_buf = None
+        self._small_bufs = [None, None]
+        
+        # Cascade search parameters, tuned for one person near a 640x480 camera.
+        # Face sizes are in full-frame pixels.
+        self.scale_factor = 1.3
+        self.min_neighbors = 3  # histogram equalization makes the stage votes more robust
+        self.min_face_size = min_face_size
+        self.max_face_size = max_face_size
+        
+        # Run the grayscale/cascade pipeline through OpenCL (T-API) when a device is available
+        self.use_opencl = cv2.ocl.haveOpenCL()
+        if self.use_opencl:
+            cv2.ocl.setUseOpenCL(True)
+            logger.info("Using OpenCL for image processing")
+        
+        # Make sure OpenCV's SIMD code paths and worker threads are enabled, leaving
+        # a core for the capture and display threads
+        cv2.setUseOptimized(True)
+        cv2.setNumThreads(max(1, (os.cpu_count() or 1) - 1))
+        for line in cv2.getBuildInformation().splitlines():
+            if line.strip().startswith(('Baseline', 'Dispatched code', 'Parallel framework')):
+                logger.info(f"OpenCV {' '.join(line.split())}")
+        
+        # Motion gating: detection is skipped while the scene is static
+        self.prev_gray = None
+        self.motion_mask = None
+        self.last_faces = None
+        self.motion_pixel_threshold = 25  # per-pixel intensity change counted as motion
+        self.motion_area_ratio = 0.005  # fraction of changed pixels needed to re-detect
+        
+        # Detection only runs on every Nth frame; faces barely move in between
+        self.detect_every = max(1, detect_every)
+        self.frame_counter = 0
+        self.trackers = []
+        if KCF_TRACKER_CREATE is not None:
+            logger.info("Using KCF trackers between detections")
+        
+        # Rasterized overlay text, keyed by (text, scale, thickness)
+        self._text_cache = {}
+        
+        # Pre-render every cooldown countdown string
+        for seconds in range(self.greeting_cooldown + 1):
+            self.render_text(f"Cooldown: {seconds}s")
+        
+        # Face photos are encoded and written on a worker thread
+        self._io_pool = ThreadPoolExecutor(max_workers=2)
+        
         # Custom greeting file
         self.custom_greeting_file = "data/custom/my_greeting.wav"
         
-        # Load the custom greeting sound
+        # Pre-decode the custom greeting and keep an output stream open, so
+        # playing it is just rewinding the buffer
+        self._pcm = None
+        self._play_pos = 0
+        self._stream = None
         try:
             if os.path.exists(self.custom_greeting_file):
-                pygame.mixer.music.load(self.custom_greeting_file)
+                self._pcm, samplerate = sf.read(self.custom_greeting_file, dtype='int16', always_2d=True)
+                self._play_pos = len(self._pcm)  # nothing playing yet
+                # High latency means larger blocks: fewer callback wakeups competing with
+                # detection and no underruns under load, at an inaudible delay for a greeting
+                self._stream = sd.OutputStream(samplerate=samplerate, channels=self._pcm.shape[1],
+                                               dtype='int16', callback=self._audio_callback,
+                                               blocksize=4096, latency='high')
+                self._stream.start()
                 logger.info(f"Using custom greeting from: {self.custom_greeting_file}")
             else:
                 logger.warning("Custom greeting file not found. Please run setup.py first to record your greeting.")
@@ -89,28 +281,248 @@ class FaceDetectionApp:
         
         logger.info("Face Detection App initialized")
     
+    def _audio_callback(self, outdata, frames, time_info, status):
+        """Feed the next block of the greeting (or silence) to the output stream"""
+        chunk = self._pcm[self._play_pos:self._play_pos + frames]
+        outdata[:len(chunk)] = chunk
+        outdata[len(chunk):] = 0
+        self._play_pos += len(chunk)
+    
     def speak(self):
         """Play the custom greeting sound"""
+        if self._stream is None:
+            logger.warning("Custom greeting file not found")
+            return False
+        
+        # Check if the greeting is currently playing
+        if self._play_pos < len(self._pcm):
+            return False
+        
+        # Rewind the buffer; the stream callback plays it from the start
+        self._play_pos = 0
+        logger.info("Played custom greeting")
+        
+        # Update the last greeting time
+        self.last_greeting_time = time.time()
+        return True
+    
+    def load_yunet_detector(self):
+        """Load the YuNet face detector, or return None if unavailable"""
+        if not hasattr(cv2, 'FaceDetectorYN'):
+            logger.warning("YuNet face detector needs OpenCV 4.8 or newer. Using the DNN detector instead.")
+            return None
+        if not os.path.exists(YUNET_MODEL_FILE):
+            logger.warning("YuNet face detector model not found. Run setup.py to download it. Using the DNN detector instead.")
+            return None
+        
         try:
-            # Check if music is currently playing
-            if not pygame.mixer.music.get_busy():
-                if os.path.exists(self.custom_greeting_file):
-                    # Load and play the custom greeting
-                    pygame.mixer.music.load(self.custom_greeting_file)
-                    pygame.mixer.music.play()
-                    logger.info("Played custom greeting")
-                    
-                    # Update the last greeting time
-                    self.last_greeting_time = time.time()
-                    return True
-                else:
-                    logger.warning("Custom greeting file not found")
-                    return False
+            # The input size is set per frame in detect_faces_yunet
+            detector = cv2.FaceDetectorYN.create(YUNET_MODEL_FILE, "", (320, 240), score_threshold=0.6)
+            logger.info("Using YuNet face detector")
+            return detector
         except Exception as e:
-            logger.error(f"Failed to play sound: {str(e)}")
-            return False
+            logger.error(f"Failed to load YuNet face detector: {str(e)}")
+            return None
+    
+    def load_dnn_detector(self):
+        """Load the ResNet-SSD face detector, or return None if unavailable"""
+        if not (os.path.exists(DNN_PROTO_FILE) and os.path.exists(DNN_MODEL_FILE)):
+            logger.warning("DNN face detector model not found. Run setup.py to download it. Using a cascade classifier instead.")
+            return None
         
-        return False
+        try:
+            net = cv2.dnn.readNetFromCaffe(DNN_PROTO_FILE, DNN_MODEL_FILE)
+            if cv2.ocl.haveOpenCL():
+                net.setPreferableTarget(cv2.dnn.DNN_TARGET_OPENCL)
+            else:
+                net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            logger.info("Using DNN face detector")
+            return net
+        except Exception as e:
+            logger.error(f"Failed to load DNN face detector: {str(e)}")
+            return None
+    
+    def load_cascade(self, detector):
+        """Load the LBP face cascade, or the Haar cascade if requested or unavailable"""
+        # LBP features are integer comparisons, much cheaper to evaluate than Haar sums
+        if detector != 'haar':
+            if os.path.exists(LBP_CASCADE_FILE):
+                cascade = cv2.CascadeClassifier(LBP_CASCADE_FILE)
+                if not cascade.empty():
+                    logger.info("Using LBP cascade face detector")
+                    return cascade
+            logger.warning("LBP face cascade not found. Run setup.py to download it. Using Haar cascade instead.")
+        
+        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        cascade = cv2.CascadeClassifier(cascade_path)
+        if cascade.empty():
+            raise RuntimeError("Failed to load face cascade classifier. Check OpenCV installation.")
+        logger.info("Using Haar cascade face detector")
+        return cascade
+    
+    def detect_faces(self, frame, gray=None):
+        """Detect faces and return their (x, y, w, h) boxes in frame coordinates"""
+        # Track (or reuse) the previous boxes on intermediate frames
+        self.frame_counter += 1
+        if self.frame_counter % self.detect_every != 0 and self.last_faces is not None:
+            return self.track_faces(frame)
+        
+        height, width = frame.shape[:2]
+        small_width, small_height = int(width * self.detection_scale), int(height * self.detection_scale)
+        
+        # Use the green channel as the intensity image unless the caller already
+        # has a grayscale one; it carries most of the luma and needs no weighted
+        # sum. Then downscale for the motion test and the cascade.
+        if self.use_opencl:
+            # With OpenCL the images are UMats, so these steps run on the GPU
+            gray = cv2.UMat(gray) if gray is not None else cv2.extractChannel(cv2.UMat(frame), 1)
+            small = cv2.resize(gray, (small_width, small_height), interpolation=cv2.INTER_AREA)
+        else:
+            # Write into the buffers of earlier frames instead of allocating new ones.
+            # The two downscaled buffers alternate so the previous one survives for
+            # the motion test.
+            if gray is None:
+                gray = self._gray_buf = cv2.extractChannel(frame, 1, dst=self._gray_buf)
+            self._small_bufs.reverse()
+            small = self._small_bufs[0] = cv2.resize(gray, (small_width, small_height), dst=self._small_bufs[0],
+                                                     interpolation=cv2.INTER_AREA)
+        
+        # Reuse the previous result while nothing in the scene is moving
+        pixel_count = small_width * small_height
+        if not self.has_motion(small, pixel_count) and self.last_faces is not None:
+            return self.last_faces
+        
+        if self.face_yunet is not None:
+            faces = self.detect_faces_yunet(frame)
+        elif self.face_net is not None:
+            faces = self.detect_faces_dnn(frame)
+        else:
+            region = self.search_region(small_width, small_height)
+            faces = self.detect_faces_cascade(small, region)
+        
+        self.last_faces = faces
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Detected {len(faces)} face(s): {np.asarray(faces).tolist()}")
+        if KCF_TRACKER_CREATE is not None:
+            self.trackers = []
+            for box in faces:
+                tracker = KCF_TRACKER_CREATE()
+                tracker.init(frame, tuple(int(v) for v in box))
+                self.trackers.append(tracker)
+        return faces
+    
+    def track_faces(self, frame):
+        """Move the last detected boxes with their trackers, dropping lost faces"""
+        if not self.trackers:
+            return self.last_faces
+        
+        boxes = []
+        trackers = []
+        for tracker in self.trackers:
+            ok, box = tracker.update(frame)
+            if ok:
+                boxes.append(box)
+                trackers.append(tracker)
+        self.trackers = trackers
+        self.last_faces = np.array(boxes, dtype=int).reshape(-1, 4)
+        return self.last_faces
+    
+    def has_motion(self, gray, pixel_count):
+        """Check whether enough pixels changed since the previous frame"""
+        prev_gray, self.prev_gray = self.prev_gray, gray
+        if prev_gray is None:
+            return True
+        
+        diff = cv2.absdiff(gray, prev_gray)
+        self.motion_mask = cv2.threshold(diff, self.motion_pixel_threshold, 1, cv2.THRESH_BINARY)[1]
+        changed = cv2.countNonZero(self.motion_mask)
+        return changed >= pixel_count * self.motion_area_ratio
+    
+    def search_region(self, width, height):
+        """Return the (x, y, w, h) area of the downscaled frame worth searching for faces"""
+        # Cover everything that moved and every face seen last time, padded by
+        # half the largest face so a partly moving face is still fully inside
+        boxes = []
+        if self.motion_mask is not None:
+            x, y, w, h = cv2.boundingRect(self.motion_mask)
+            if w > 0 and h > 0:
+                boxes.append((x, y, x + w, y + h))
+        if self.last_faces is not None and len(self.last_faces) > 0:
+            faces = np.asarray(self.last_faces) * self.detection_scale
+            boxes.extend(np.hstack([faces[:, :2], faces[:, :2] + faces[:, 2:]]).astype(int).tolist())
+        if not boxes:
+            return 0, 0, width, height
+        
+        boxes = np.array(boxes)
+        pad = int(self.max_face_size * self.detection_scale / 2)
+        x1, y1 = np.maximum(boxes[:, :2].min(axis=0) - pad, 0)
+        x2, y2 = np.minimum(boxes[:, 2:].max(axis=0) + pad, (width, height))
+        return int(x1), int(y1), int(x2 - x1), int(y2 - y1)
+    
+    def detect_faces_yunet(self, frame):
+        """Detect faces with the YuNet CNN on a downscaled BGR frame"""
+        height, width = frame.shape[:2]
+        size = (int(width * self.detection_scale), int(height * self.detection_scale))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        self.face_yunet.setInputSize(size)
+        _, faces = self.face_yunet.detect(small)
+        if faces is None:
+            return np.empty((0, 4), dtype=int)
+        
+        # Each row is a box, five landmarks and a score; keep the box in frame
+        # coordinates, clipped to the frame as corners so a face past an edge isn't shifted
+        boxes = (faces[:, :4] / self.detection_scale).astype(int)
+        boxes[:, 2:] += boxes[:, :2]
+        boxes[:, 0::2] = np.clip(boxes[:, 0::2], 0, width)
+        boxes[:, 1::2] = np.clip(boxes[:, 1::2], 0, height)
+        boxes[:, 2:] -= boxes[:, :2]
+        return boxes[(boxes[:, 2] > 0) & (boxes[:, 3] > 0)]
+    
+    def detect_faces_dnn(self, frame):
+        """Detect faces with a single forward pass of the ResNet-SSD network"""
+        height, width = frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(frame, (300, 300)), 1.0, (300, 300),
+                                     (104.0, 177.0, 123.0))
+        self.face_net.setInput(blob)
+        detections = self.face_net.forward()[0, 0]
+        
+        # Keep confident detections and convert them to clipped (x, y, w, h) boxes
+        detections = detections[detections[:, 2] > self.dnn_confidence]
+        boxes = (detections[:, 3:7] * np.array([width, height, width, height])).astype(int)
+        boxes[:, 0::2] = np.clip(boxes[:, 0::2], 0, width)
+        boxes[:, 1::2] = np.clip(boxes[:, 1::2], 0, height)
+        boxes[:, 2:] -= boxes[:, :2]
+        return boxes[(boxes[:, 2] > 0) & (boxes[:, 3] > 0)]
+    
+    def detect_faces_cascade(self, small, region):
+        """Detect faces with the cascade classifier in a region of a downscaled grayscale frame"""
+        # Only scan the region of interest
+        x, y, w, h = region
+        if self.use_opencl:
+            roi = cv2.UMat(small, (y, y + h), (x, x + w))
+        else:
+            roi = small[y:y + h, x:x + w]
+        
+        # Normalize contrast so weak candidates are rejected in earlier stages
+        roi = cv2.equalizeHist(roi)
+        
+        # Detect faces within the expected size range
+        min_size = int(self.min_face_size * self.detection_scale)
+        max_size = int(self.max_face_size * self.detection_scale)
+        faces = self.face_cascade.detectMultiScale(
+            roi,
+            scaleFactor=self.scale_factor,
+            minNeighbors=self.min_neighbors,
+            minSize=(min_size, min_size),
+            maxSize=(max_size, max_size),
+            flags=cv2.CASCADE_SCALE_IMAGE
+        )
+        
+        if len(faces) == 0:
+            return faces
+        
+        # Move the boxes out of the region and scale them back up to frame coordinates
+        return ((faces + (x, y, 0, 0)) / self.detection_scale).astype(int)
     
     def save_face_photo(self, frame, face):
         """Save a photo of the detected face"""
@@ -128,32 +540,35 @@ class FaceDetectionApp:
             x1 = max(0, face[0] - margin)
             x2 = min(frame.shape[1], face[0] + face[2] + margin)
             
-            face_img = frame[y1:y2, x1:x2]
+            # Copy the region so the frame can be reused while the photo is written
+            face_img = frame[y1:y2, x1:x2].copy()
             
-            # Save the face image
-            cv2.imwrite(filename, face_img)
+            # Encode and save the face image off the detection loop
+            self._io_pool.submit(self.write_face_photo, filename, face_img)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to save face photo: {str(e)}")
+            return False
+    
+    def write_face_photo(self, filename, face_img):
+        """Write a face photo to disk (runs on the I/O worker thread)"""
+        try:
+            # Save the face image; quality 85 is visually the same for a face crop
+            # but encodes faster and writes a smaller file than the default 95
+            cv2.imwrite(filename, face_img, [cv2.IMWRITE_JPEG_QUALITY, 85])
             
             # Set file permissions to be readable by anyone (0o644 = rw-r--r--)
             os.chmod(filename, 0o644)
             
             logger.info(f"Saved face photo to {filename}")
-            return True
         except Exception as e:
             logger.error(f"Failed to save face photo: {str(e)}")
-            return False
     
-    def process_frame(self, frame):
+    def process_frame(self, frame, gray=None):
         """Process a single frame for face detection"""
-        # Convert to grayscale for face detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
         # Detect faces
-        faces = self.face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=1.1,
-            minNeighbors=5,
-            minSize=(30, 30)
-        )
+        faces = self.detect_faces(frame, gray)
+        now = time.time()
         
         # Return early if no faces detected
         if len(faces) == 0:
@@ -162,15 +577,15 @@ class FaceDetectionApp:
         
         # If this is the first frame with a face, start the buffer timer
         if self.face_detection_start_time is None:
-            self.face_detection_start_time = time.time()
+            self.face_detection_start_time = now
         
         # Calculate how long the face has been visible
-        face_visible_time = time.time() - self.face_detection_start_time
+        face_visible_time = now - self.face_detection_start_time
         
         # Check if we've waited long enough
         if face_visible_time >= self.face_buffer_time:
             # Check if we're past the cooldown period
-            if (time.time() - self.last_greeting_time) >= self.greeting_cooldown:
+            if (now - self.last_greeting_time) >= self.greeting_cooldown:
                 # Process the first detected face
                 face = faces[0]
                 
@@ -181,61 +596,167 @@ class FaceDetectionApp:
                 # Reset the detection start time
                 self.face_detection_start_time = None
         
-        # Draw rectangles around all detected faces
-        for (x, y, w, h) in faces:
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        # Draw rectangles around all detected faces in a single call
+        faces = np.asarray(faces, dtype=np.int32)
+        x1, y1 = faces[:, 0], faces[:, 1]
+        x2, y2 = x1 + faces[:, 2], y1 + faces[:, 3]
+        corners = np.stack([x1, y1, x2, y1, x2, y2, x1, y2], axis=1).reshape(-1, 4, 2)
+        cv2.polylines(frame, list(corners), True, (0, 255, 0), 2)
         
         # Display buffer time if face is detected
         if self.face_detection_start_time is not None:
             remaining_buffer = max(0, self.face_buffer_time - face_visible_time)
-            cv2.putText(frame, f"Buffer: {remaining_buffer:.1f}s", (10, 30), 
-                      cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            self.draw_text(frame, f"Buffer: {remaining_buffer:.1f}s", (10, 30), (0, 255, 0))
         
         # Display cooldown time if active
-        if (time.time() - self.last_greeting_time) < self.greeting_cooldown:
-            remaining_cooldown = round(self.greeting_cooldown - (time.time() - self.last_greeting_time))
-            cv2.putText(frame, f"Cooldown: {remaining_cooldown}s", (10, 60), 
-                      cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+        since_greeting = now - self.last_greeting_time
+        if since_greeting < self.greeting_cooldown:
+            remaining_cooldown = min(round(self.greeting_cooldown - since_greeting), self.greeting_cooldown)
+            self.draw_text(frame, f"Cooldown: {remaining_cooldown}s", (10, 60), (0, 0, 255))
         
         return frame
     
+    def render_text(self, text, scale=0.7, thickness=2):
+        """Return the cached (mask, ascent) for a string, rasterizing it on first use"""
+        key = (text, scale, thickness)
+        cached = self._text_cache.get(key)
+        if cached is None:
+            (width, height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+            mask = np.zeros((height + baseline + 2 * thickness, width + 2 * thickness), np.uint8)
+            cv2.putText(mask, text, (thickness, height + thickness),
+                        cv2.FONT_HERSHEY_SIMPLEX, scale, 255, thickness)
+            cached = (mask > 0, height + thickness)
+            self._text_cache[key] = cached
+        return cached
+    
+    def draw_text(self, frame, text, org, color, scale=0.7, thickness=2):
+        """Draw text at org (baseline left, as in cv2.putText) from a cached mask"""
+        # Overlay strings repeat from frame to frame, so rasterize each one only once
+        mask, ascent = self.render_text(text, scale, thickness)
+        
+        # Clip the mask to the frame and paint the covered pixels
+        y0, x0 = org[1] - ascent, org[0] - thickness
+        y1, x1 = min(frame.shape[0], y0 + mask.shape[0]), min(frame.shape[1], x0 + mask.shape[1])
+        my, mx = max(0, -y0), max(0, -x0)
+        y0, x0 = max(0, y0), max(0, x0)
+        if y1 <= y0 or x1 <= x0:
+            return
+        frame[y0:y1, x0:x1][mask[my:my + y1 - y0, mx:mx + x1 - x0]] = color
+    
+    def configure_camera(self):
+        """Set the capture resolution, frame rate and pixel format"""
+        self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        self.frame_size = (int(self.camera.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                           int(self.camera.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        
+        self.camera.set(cv2.CAP_PROP_FPS, 30)
+        
+        # In a raw YUYV frame the Y plane is the grayscale image, so detection
+        # needs no color conversion. Fall back to BGR frames if unsupported.
+        # MJPEG frames are decoded to BGR but need far less USB bandwidth.
+        self.raw_yuyv = False
+        if self.pixel_format == 'mjpg':
+            self.camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        elif (self.camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'YUYV'))
+                and self.camera.set(cv2.CAP_PROP_CONVERT_RGB, 0)):
+            ret, frame = self.camera.read()
+            if ret and self.as_yuyv(frame) is not None:
+                self.raw_yuyv = True
+            else:
+                self.camera.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+        
+        # Report what the driver actually negotiated, which may differ from the request
+        # (masked to 32 bits, since some backends report -1 for an unsupported property)
+        fourcc = (int(self.camera.get(cv2.CAP_PROP_FOURCC)) & 0xFFFFFFFF).to_bytes(4, 'little').decode('ascii', errors='replace')
+        logger.info(f"Capturing {'raw YUYV' if self.raw_yuyv else 'BGR'} frames at "
+                    f"{self.frame_size[0]}x{self.frame_size[1]} (camera format {fourcc})")
+    
+    def as_yuyv(self, frame):
+        """View a raw capture buffer as a (height, width, 2) YUYV image, or None"""
+        width, height = self.frame_size
+        if frame.ndim == 3 and frame.shape == (height, width, 2):
+            return frame
+        if frame.size == height * width * 2:
+            return frame.reshape(height, width, 2)
+        return None
+    
+    def split_frame(self, frame):
+        """Return the BGR frame for display and the grayscale image for detection"""
+        if not self.raw_yuyv:
+            return frame, None
+        
+        yuyv = self.as_yuyv(frame)
+        return cv2.cvtColor(yuyv, cv2.COLOR_YUV2BGR_YUYV), yuyv[:, :, 0]
+    
+    def open_camera_source(self, camera_source):
+        """Try to open a camera by device path or index, returning True on success"""
+        try:
+            # Check if the camera_source is a string path to a device
+            if isinstance(camera_source, str) and camera_source.startswith('/dev/'):
+                self.camera = open_capture(camera_source)
+                if self.camera.isOpened():
+                    logger.info(f"Camera opened successfully using device: {camera_source}")
+                    return True
+            
+            # Try as an integer index or string that can be converted to int
+            try:
+                camera_idx = int(camera_source)
+                self.camera = open_capture(camera_idx)
+                if self.camera.isOpened():
+                    logger.info(f"Camera opened successfully using index: {camera_idx}")
+                    return True
+            except ValueError:
+                logger.warning(f"Could not interpret camera source: {camera_source}")
+        except Exception as e:
+            logger.error(f"Error opening camera source {camera_source}: {str(e)}")
+        return False
+    
+    def load_cached_camera(self):
+        """Return the camera source that worked last time, if any"""
+        try:
+            with open(CAMERA_CACHE_FILE) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+    
+    def save_cached_camera(self, camera_source):
+        """Remember the camera source so the next start can skip probing"""
+        try:
+            with open(CAMERA_CACHE_FILE, 'w') as f:
+                f.write(str(camera_source))
+        except OSError as e:
+            logger.warning(f"Could not save camera source: {str(e)}")
+    
     def init_camera(self, camera_source=None):
         """Initialize camera with various fallback options"""
         if self.camera is not None and self.camera.isOpened():
             self.camera.release()
             
         # Try the specified camera source first if provided
-        if camera_source is not None:
-            try:
-                # Check if the camera_source is a string path to a device
-                if isinstance(camera_source, str) and camera_source.startswith('/dev/'):
-                    self.camera = cv2.VideoCapture(camera_source)
-                    if self.camera.isOpened():
-                        logger.info(f"Camera opened successfully using device: {camera_source}")
-                        return
-                
-                # Try as an integer index or string that can be converted to int
-                try:
-                    camera_idx = int(camera_source)
-                    self.camera = cv2.VideoCapture(camera_idx)
-                    if self.camera.isOpened():
-                        logger.info(f"Camera opened successfully using index: {camera_idx}")
-                        return
-                except ValueError:
-                    logger.warning(f"Could not interpret camera source: {camera_source}")
-            except Exception as e:
-                logger.error(f"Error opening specified camera source {camera_source}: {str(e)}")
+        if camera_source is not None and self.open_camera_source(camera_source):
+            self.save_cached_camera(camera_source)
+            return
+        
+        # Then the camera that worked last time
+        cached_source = self.load_cached_camera()
+        if cached_source is not None and cached_source != str(camera_source):
+            if self.open_camera_source(cached_source):
+                return
         
         # Try different indices if no specific source was given or it failed
-        for idx in range(10):  # Try indices 0-9
+        for idx in range(self.max_cameras):
+            if not camera_index_exists(idx):
+                continue
             try:
                 logger.info(f"Trying to open camera with index {idx}...")
-                self.camera = cv2.VideoCapture(idx)
+                self.camera = open_capture(idx)
                 if self.camera.isOpened():
                     # Read a test frame to ensure it's working
                     ret, _ = self.camera.read()
                     if ret:
                         logger.info(f"Successfully opened camera with index {idx}")
+                        self.save_cached_camera(idx)
                         return
                     else:
                         logger.warning(f"Camera with index {idx} opened but failed to read frame")
@@ -250,42 +771,95 @@ class FaceDetectionApp:
         self.camera = cv2.VideoCapture(0)  # Set to default for object consistency
         raise RuntimeError("Could not open camera. Please check your camera connection.")
     
-    def run(self):
-        """Main application loop"""
-        logger.info("Starting face detection loop")
-        
+    def start_reader(self):
+        """Start the background frame capture thread"""
+        self.reader = CameraThread(self.camera, self.target_fps)
+        self.reader.start()
+    
+    def stop_reader(self):
+        """Stop the background frame capture thread"""
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
+    
+    def quit_requested(self):
+        """Check the terminal for a 'q' line without blocking"""
+        readable, _, _ = select.select([sys.stdin], [], [], 0)
+        if readable:
+            return sys.stdin.readline().strip().lower() == 'q'
+        return False
+    
+    def _detect_loop(self):
+        """Detect faces in new frames and pass the annotated frames to the display"""
         try:
-            while True:
-                # Check if camera is opened
-                if not self.camera.isOpened():
-                    logger.error("Camera connection lost. Attempting to reconnect...")
-                    try:
-                        self.init_camera()
-                    except RuntimeError:
-                        logger.error("Failed to reconnect to camera. Exiting...")
-                        break
+            while not self.detect_stop.is_set():
+                # Wait for the newest frame from the capture thread
+                frame = self.reader.take_frame()
                 
-                # Capture frame from camera
-                ret, frame = self.camera.read()
-                if not ret:
+                if frame is None:
+                    if not self.reader.failed:
+                        # No new frame yet
+                        continue
+                    
                     logger.error("Failed to capture frame from camera")
                     # Try to reinitialize the camera
-                    try:
-                        logger.info("Attempting to reinitialize camera...")
-                        self.init_camera()
-                        continue
-                    except RuntimeError:
-                        break
+                    logger.info("Attempting to reinitialize camera...")
+                    self.stop_reader()
+                    self.init_camera()
+                    self.configure_camera()
+                    self.start_reader()
+                    continue
+                
+                # Raw YUYV frames provide the grayscale image directly
+                frame, gray = self.split_frame(frame)
                 
                 # Process the frame (detect faces, log, and potentially speak)
-                processed_frame = self.process_frame(frame)
+                processed_frame = self.process_frame(frame, gray)
+                
+                # Replace any frame the display has not picked up yet
+                try:
+                    self.display_queue.get_nowait()
+                except queue.Empty:
+                    pass
+                self.display_queue.put(processed_frame)
+        except Exception as e:
+            logger.error(f"Error in detection loop: {str(e)}")
+        finally:
+            self.detect_stop.set()
+    
+    def run(self):
+        """Main application loop"""
+        logger.info("Starting face detection loop")
+        
+        # Capture, detection and display run concurrently, so the frame rate is
+        # set by the slowest stage rather than the sum of all three. The window
+        # stays on the main thread, as some GUI backends require.
+        self.display_queue = queue.Queue(maxsize=1)
+        self.detect_stop = threading.Event()
+        detect_thread = threading.Thread(target=self._detect_loop, daemon=True)
+        
+        try:
+            self.start_reader()
+            detect_thread.start()
+            while not self.detect_stop.is_set():
+                try:
+                    frame = self.display_queue.get(timeout=0.1)
+                except queue.Empty:
+                    frame = None
                 
-                # Add instructions to the frame
-                cv2.putText(processed_frame, "Press 'q' to quit", (10, frame.shape[0] - 10),
-                          cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                # Without a window there is no GUI event loop to pump
+                if self.headless:
+                    if self.quit_requested():
+                        break
+                    continue
                 
-                # Display the resulting frame
-                cv2.imshow('Face Detection', processed_frame)
+                if frame is not None:
+                    # Add instructions to the frame
+                    self.draw_text(frame, "Press 'q' to quit", (10, frame.shape[0] - 10),
+                                   (255, 255, 255), scale=0.6)
+                    
+                    # Display the resulting frame
+                    cv2.imshow('Face Detection', frame)
                 
                 # Break loop on 'q' key press
                 if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -297,20 +871,29 @@ class FaceDetectionApp:
             logger.error(f"Error in main loop: {str(e)}")
         finally:
             # Release resources
+            self.detect_stop.set()
+            if detect_thread.is_alive():
+                detect_thread.join()
+            self.stop_reader()
             if self.camera is not None:
                 self.camera.release()
             cv2.destroyAllWindows()
-            pygame.mixer.quit()
+            self._io_pool.shutdown(wait=True)
+            if self._stream is not None:
+                self._stream.close()
             logger.info("Application terminated")
 
-def list_available_cameras():
+def list_available_cameras(max_cameras=3):
     """List available camera devices and indices"""
     print("Searching for available cameras...")
     
     # Try different indices
     found_cameras = []
-    for idx in range(10):  # Try indices 0-9
-        cap = cv2.VideoCapture(idx)
+    for idx in range(max_cameras):
+        if not camera_index_exists(idx):
+            found_cameras.append(f"Index {idx}: Not available")
+            continue
+        cap = open_capture(idx)
         if cap.isOpened():
             ret, frame = cap.read()
             if ret:
@@ -323,17 +906,14 @@ def list_available_cameras():
     
     # Try to list video devices in /dev if on Linux
     try:
-        import subprocess
-        result = subprocess.run(["ls", "-l", "/dev/video*"], 
-                               stdout=subprocess.PIPE, 
-                               stderr=subprocess.PIPE,
-                               universal_newlines=True)
-        if result.returncode == 0:
+        nodes = sorted(glob.glob('/dev/video*'))
+        if nodes:
             print("\nDetected video devices:")
-            print(result.stdout)
+            for node in nodes:
+                print(f"{stat.filemode(os.stat(node).st_mode)}  {node}")
         else:
             print("\nNo video devices found in /dev or can't access them.")
-    except:
+    except OSError:
         print("Could not check for video devices in /dev (might not be on Linux or insufficient permissions)")
     
     print("\nCamera availability:")
@@ -348,9 +928,12 @@ def list_available_cameras():
 if __name__ == "__main__":
     try:
         if args.list_cameras:
-            list_available_cameras()
+            list_available_cameras(args.max_cameras)
         else:
-            app = FaceDetectionApp(args.camera)
+            app = FaceDetectionApp(args.camera, args.detector, args.headless, args.max_cameras,
+                                   min_face_size=args.min_face_size, max_face_size=args.max_face_size,
+                                   pixel_format=args.pixel_format, target_fps=args.target_fps,
+                                   detect_every=args.detect_every)
             app.run()
     except Exception as e:
         logger.error(f"Failed to start application: {str(e)}")
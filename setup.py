@@ -8,11 +8,75 @@ requirements.txt, and runs the face detection application.
 
 import os
 import sys
+import hashlib
+import json
 import platform
+import shlex
+import shutil
 import subprocess
 import time
+import urllib.request
 from pathlib import Path
 
+# Face detector model files and where to download them from
+MODEL_FILES = {
+    "data/models/deploy.prototxt":
+        "https://raw.githubusercontent.com/opencv/opencv/master/samples/dnn/face_detector/deploy.prototxt",
+    "data/models/res10_300x300_ssd_iter_140000.caffemodel":
+        "https://raw.githubusercontent.com/opencv/opencv_3rdparty/dnn_samples_face_detector_20170830/res10_300x300_ssd_iter_140000.caffemodel",
+    "data/models/lbpcascade_frontalface_improved.xml":
+        "https://raw.githubusercontent.com/opencv/opencv/master/data/lbpcascades/lbpcascade_frontalface_improved.xml",
+    "data/models/face_detection_yunet_2023mar.onnx":
+        "https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/face_detection_yunet_2023mar.onnx",
+}
+
+# Interpreter and pip inside the virtual environment, which only depend on the platform
+IS_WINDOWS = platform.system() == "Windows"
+VENV_BIN = os.path.join("venv", "Scripts" if IS_WINDOWS else "bin")
+VENV_PYTHON = os.path.join(VENV_BIN, "python.exe" if IS_WINDOWS else "python")
+VENV_PIP = os.path.join(VENV_BIN, "pip.exe" if IS_WINDOWS else "pip")
+
+# Digest of requirements.txt from the last successful install, so unchanged requirements aren't reinstalled
+REQ_HASH_FILE = os.path.join("venv", ".req_hash")
+
+# Use uv for the virtual environment and installs when it's available, it's much faster than pip
+UV_PATH = shutil.which("uv")
+
+# Recording code run with the virtual environment's Python, where sounddevice is installed.
+# Usage: python -c RECORD_SCRIPT <output_file>
+RECORD_SCRIPT = """
+import os
+import sys
+import time
+import sounddevice as sd
+import soundfile as sf
+
+output_file = sys.argv[1]
+seconds = 5
+samplerate = 44100
+
+print("\\nRecording will begin in:")
+for i in range(3, 0, -1):
+    print(f"{i}...")
+    time.sleep(1)
+
+print("Recording... Speak now!")
+
+# Record audio as 16-bit PCM, the format main.py plays it back in
+recording = sd.rec(int(seconds * samplerate), samplerate=samplerate, channels=1, dtype='int16')
+sd.wait()  # Wait until recording is finished
+
+print("Recording finished!")
+
+# Make sure directory exists
+os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+# Save as WAV file
+sf.write(output_file, recording, samplerate, subtype='PCM_16')
+
+print(f"Audio saved to {output_file}")
+"""
+
 def print_header(text):
     """Print a formatted header"""
     print("\n" + "=" * 60)
@@ -35,11 +99,10 @@ def run_command(command, shell=False):
     """Run a command and return success status"""
     try:
         if isinstance(command, str) and not shell:
-            command = command.split()
-        result = subprocess.run(command, shell=shell, check=True)
-        return True
-    except subprocess.CalledProcessError:
-        return False
+            # shlex keeps quoted paths with spaces together
+            command = shlex.split(command, posix=not IS_WINDOWS)
+        result = subprocess.run(command, shell=shell)
+        return result.returncode == 0
     except Exception:
         return False
 
@@ -56,7 +119,7 @@ def check_python():
         return True
 
 def setup_virtual_environment():
-    """Create and activate a virtual environment"""
+    """Start creating the virtual environment in the background"""
     print_header("Setting up Virtual Environment")
     
     venv_dir = "venv"
@@ -64,10 +127,27 @@ def setup_virtual_environment():
     # Check if venv already exists
     if Path(venv_dir).exists():
         print_warning(f"Virtual environment already exists at {venv_dir}")
-        return True
+        return None
     
     print(f"Creating virtual environment in {venv_dir}...")
-    if run_command([sys.executable, "-m", "venv", venv_dir]):
+    if UV_PATH:
+        command = [UV_PATH, "venv", venv_dir]
+    else:
+        command = [sys.executable, "-m", "venv", venv_dir]
+    
+    # Return the running process so other setup work can overlap with it
+    try:
+        return subprocess.Popen(command)
+    except Exception as e:
+        print_error(f"Failed to create virtual environment: {e}")
+        return False
+
+def wait_for_virtual_environment(process):
+    """Wait for the virtual environment creation started by setup_virtual_environment"""
+    if process is None:
+        return True
+    
+    if process is not False and process.wait() == 0:
         print_success("Virtual environment created successfully.")
         return True
     else:
@@ -76,32 +156,74 @@ def setup_virtual_environment():
 
 def get_venv_python():
     """Get path to Python in virtual environment"""
-    if platform.system() == "Windows":
-        return os.path.join("venv", "Scripts", "python.exe")
-    else:
-        return os.path.join("venv", "bin", "python")
+    return VENV_PYTHON
 
 def get_venv_pip():
     """Get path to pip in virtual environment"""
-    if platform.system() == "Windows":
-        return os.path.join("venv", "Scripts", "pip.exe")
-    else:
-        return os.path.join("venv", "bin", "pip")
+    return VENV_PIP
+
+def get_pip_version(pip_path):
+    """Get the version of pip as a (major, minor) tuple, or None if it can't be determined"""
+    try:
+        output = subprocess.run([pip_path, "--version"], capture_output=True, text=True).stdout
+        return tuple(int(part) for part in output.split()[1].split(".")[:2])
+    except Exception:
+        return None
+
+def requirements_satisfied(pip_path):
+    """Check with a pip dry run whether everything in requirements.txt is already installed"""
+    try:
+        result = subprocess.run(
+            [pip_path, "install", "--dry-run", "--quiet", "--report", "-", "-r", "requirements.txt"],
+            capture_output=True, text=True)
+        if result.returncode != 0:
+            return False
+        report = json.loads(result.stdout)
+        return not report.get("install")
+    except Exception:
+        return False
 
 def install_dependencies():
     """Install dependencies from requirements.txt"""
     print_header("Installing Dependencies")
     
-    pip_path = get_venv_pip()
-    
-    # Upgrade pip first
-    print("Upgrading pip...")
-    run_command([pip_path, "install", "--upgrade", "pip"])
+    # Skip the install when requirements.txt hasn't changed since the last one
+    req_hash = hashlib.sha256(Path("requirements.txt").read_bytes() + get_venv_python().encode()).hexdigest()
+    try:
+        with open(REQ_HASH_FILE) as f:
+            if f.read().strip() == req_hash:
+                print_success("Dependencies unchanged, skipping install.")
+                return True
+    except OSError:
+        pass
+    
+    if UV_PATH:
+        # uv brings its own resolver, so there's no pip to upgrade
+        print("Installing dependencies from requirements.txt with uv...")
+        command = [UV_PATH, "pip", "install", "--python", get_venv_python(), "-r", "requirements.txt"]
+    else:
+        pip_path = get_venv_pip()
+        
+        # Upgrade pip first, unless it's already recent enough
+        pip_version = get_pip_version(pip_path)
+        if not pip_version or pip_version < (23, 0):
+            print("Upgrading pip...")
+            run_command([pip_path, "install", "--upgrade", "pip"])
+            pip_version = get_pip_version(pip_path)
+        
+        # Let a resolver dry run decide whether there's anything to install (needs pip 22.2+)
+        if pip_version and pip_version >= (22, 2) and requirements_satisfied(pip_path):
+            print("All requirements are already installed.")
+            command = None
+        else:
+            print("Installing dependencies from requirements.txt...")
+            command = [pip_path, "install", "-r", "requirements.txt"]
     
     # Install requirements
-    print("Installing dependencies from requirements.txt...")
-    if run_command([pip_path, "install", "-r", "requirements.txt"]):
+    if command is None or run_command(command):
         print_success("Successfully installed all dependencies.")
+        with open(REQ_HASH_FILE, "w") as f:
+            f.write(req_hash)
         return True
     else:
         print_error("Failed to install dependencies.")
@@ -111,23 +233,47 @@ def create_directories():
     """Create necessary directories for the application"""
     print_header("Creating Directories")
     
+    # Only leaf directories are listed, their parents (e.g. data/custom) are created along the way
     directories = [
         "logs",
         "data/audio",
-        "data/custom",
-        "data/custom/greetings"
+        "data/custom/greetings",
+        "data/models"
     ]
     
     for directory in directories:
-        path = Path(directory)
-        if not path.exists():
-            path.mkdir(parents=True)
-            print(f"Created directory: {directory}")
-        else:
-            print(f"Directory already exists: {directory}")
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        print(f"Directory ready: {directory}")
     
     return True
 
+def download_models():
+    """Download the face detector model files"""
+    print_header("Downloading Face Detector Models")
+    
+    # Keep going after a failure so the fallback detectors' files are still fetched
+    all_downloaded = True
+    for path, url in MODEL_FILES.items():
+        if os.path.exists(path):
+            print(f"Model already exists: {path}")
+            continue
+        
+        print(f"Downloading {os.path.basename(path)}...")
+        try:
+            # Download to a temporary name so an interrupted download isn't mistaken for a model
+            urllib.request.urlretrieve(url, path + ".part")
+            os.replace(path + ".part", path)
+            print_success(f"Downloaded {path}")
+        except Exception as e:
+            print_warning(f"Failed to download {path}: {e}")
+            if os.path.exists(path + ".part"):
+                os.remove(path + ".part")
+            all_downloaded = False
+    
+    if not all_downloaded:
+        print_warning("The application will fall back to a simpler face detector.")
+    return all_downloaded
+
 def record_custom_greetings():
     """Record user's voice for the custom greeting"""
     print_header("Custom Voice Recording")
@@ -136,60 +282,16 @@ def record_custom_greetings():
     custom_dir = Path("data/custom")
     
     # Create the directory if it doesn't exist
-    if not custom_dir.exists():
-        custom_dir.mkdir(parents=True)
+    custom_dir.mkdir(parents=True, exist_ok=True)
     
     # Function to record greeting
     def record_greeting(filename, prompt):
         python_path = get_venv_python()
         
-        # Create a temporary Python script for recording
-        temp_script_path = "temp_record.py"
-        with open(temp_script_path, "w") as f:
-            f.write("""
-import sounddevice as sd
-import soundfile as sf
-import numpy as np
-import os
-import time
-
-def record_audio(output_file, seconds=5, samplerate=44100):
-    print("\\nRecording will begin in:")
-    for i in range(3, 0, -1):
-        print(f"{i}...")
-        time.sleep(1)
-    
-    print("Recording... Speak now!")
-    
-    # Record audio
-    recording = sd.rec(int(seconds * samplerate), samplerate=samplerate, channels=1, dtype='float32')
-    sd.wait()  # Wait until recording is finished
-    
-    print("Recording finished!")
-    
-    # Make sure directory exists
-    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    
-    # Save as WAV file
-    sf.write(output_file, recording, samplerate)
-    
-    print(f"Audio saved to {output_file}")
-    return True
-
-# Record audio
-record_audio("%s")
-""" % filename)
-        
         print(f"\n{prompt}")
         
-        # Run the recording script
-        success = run_command([python_path, temp_script_path])
-        
-        # Remove temporary script
-        if os.path.exists(temp_script_path):
-            os.remove(temp_script_path)
-            
-        return success
+        # Run the recording code in the venv's Python, passing the output file as an argument
+        return run_command([python_path, "-c", RECORD_SCRIPT, filename])
     
     print("You will record a custom greeting that will be played when a face is detected.")
     print("The greeting will be played after a 1-second buffer and there will be a 60-second cooldown between greetings.")
@@ -239,17 +341,21 @@ def main():
         print_error("Incompatible Python version. Please use Python 3.6 or higher.")
         sys.exit(1)
     
-    # Set up virtual environment
-    if not setup_virtual_environment():
+    # Set up virtual environment, creating directories while it's being built
+    venv_process = setup_virtual_environment()
+    
+    # Create directories
+    directories_created = create_directories()
+    
+    if not wait_for_virtual_environment(venv_process) or not directories_created:
         sys.exit(1)
     
     # Install dependencies
     if not install_dependencies():
         sys.exit(1)
     
-    # Create directories
-    if not create_directories():
-        sys.exit(1)
+    # Download face detector models
+    download_models()
     
     # Record custom greetings
     record_custom_greetings()